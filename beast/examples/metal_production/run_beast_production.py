@@ -87,9 +87,16 @@ def run_beast_production(basename,
 
     if physicsmodel:
 
+        # datamodels derived from the phat_small example build the physics
+        #   models on demand, older ones define them directly
+        if hasattr(datamodel, 'build_physics_models'):
+            physics_models = datamodel.build_physics_models()
+        else:
+            physics_models = datamodel
+
         # download and load the isochrones
         (iso_fname, oiso) = make_iso_table(datamodel.project,
-                                           oiso=datamodel.oiso,
+                                           oiso=physics_models.oiso,
                                            logtmin=datamodel.logt[0],
                                            logtmax=datamodel.logt[1],
                                            dlogt=datamodel.logt[2],
@@ -109,7 +116,7 @@ def run_beast_production(basename,
         (spec_fname, g_spec) = make_spectral_grid(
             datamodel.project,
             oiso,
-            osl=datamodel.osl,
+            osl=physics_models.osl,
             redshift=redshift,
             distance=datamodel.distances,
             distance_unit=datamodel.distance_unit,
@@ -127,7 +134,7 @@ def run_beast_production(basename,
             datamodel.project,
             g_pspec,
             datamodel.filters,
-            extLaw=datamodel.extLaw,
+            extLaw=physics_models.extLaw,
             av=datamodel.avs,
             rv=datamodel.rvs,
             fA=datamodel.fAs,
@@ -198,13 +205,20 @@ def run_beast_production(basename,
         # get the modesedgrid on which to generate the noisemodel
         modelsedgrid = FileSEDGrid(modelsedgrid_filename)
 
+        # datamodels derived from the phat_small example compute the absflux
+        #   matrix on demand, older ones define it directly
+        if hasattr(datamodel, 'get_absflux_a_matrix'):
+            absflux_a_matrix = datamodel.get_absflux_a_matrix()
+        else:
+            absflux_a_matrix = datamodel.absflux_a_matrix
+
         # generate the AST noise model
         noisemodel.make_toothpick_noise_model( \
             datamodel.noisefile,
             datamodel.astfile,
             modelsedgrid,
             use_rate=True,
-            absflux_a_matrix=datamodel.absflux_a_matrix)
+            absflux_a_matrix=absflux_a_matrix)
 
     if trim:
         print('Trimming the model and noise grids')
@@ -3,17 +3,26 @@ BEAST datamodel for the example based on M31 PHAT data
 """
 from __future__ import (absolute_import, division, print_function)
 
+import os
+import hashlib
+import tempfile
+from collections import OrderedDict, namedtuple
+
 import numpy as np
 
 from astropy import units
+from astropy.table import Table
 
 # BEAST imports
-from beast.physicsmodel.stars import isochrone
-from beast.physicsmodel.stars import stellib
-from beast.physicsmodel.dust import extinction
+#   the physics models (isochrone, stellib, extinction), absflux_covmat and
+#   the numba kernels are imported where used, so that reading the
+#   configuration does not load them
+from beast import __version__ as beast_version
+from beast.config import __ROOT__
 from beast.observationmodel.observations import Observations
 from beast.observationmodel.vega import Vega
-from beast.observationmodel.noisemodel import absflux_covmat
+from beast.external.eztables import AstroTable
+from beast.tools.decorators import memoize
 
 #from extra_filters import make_integration_filter, make_top_hat_filter
 
@@ -40,18 +49,31 @@ surveyname = 'PHAT'
 filters = ['HST_WFC3_F275W','HST_WFC3_F336W','HST_ACS_WFC_F475W',
            'HST_ACS_WFC_F814W', 'HST_WFC3_F110W','HST_WFC3_F160W']
 
-# basefilters : list of strings
+# basefilters : tuple of strings
 #   short names for filters
-basefilters = ['F275W','F336W','F475W',
-               'F814W','F110W','F160W']
+basefilters = ('F275W','F336W','F475W',
+               'F814W','F110W','F160W')
 
-# obs_colnames : list of strings
+# obs_colnames : tuple of strings
 #   names of columns for filters in the observed catalog
 #   need to match column names in the observed catalog,
 #   input data MUST be in fluxes, NOT in magnitudes 
 #   fluxes MUST be in normalized Vega units
-obs_colnames = [ f.lower() + '_rate' for f in basefilters ]
-#obs_colnames = [ f.upper() + '_RATE' for f in basefilters ]
+obs_colnames = tuple( f.lower() + '_rate' for f in basefilters )
+#obs_colnames = tuple( f.upper() + '_RATE' for f in basefilters )
+
+# obs_keep_colnames : None or list of strings
+#   None: the full observed catalog is read in memory
+#   list: only the obs_colnames fluxes and these columns of the observed
+#   catalog are read (memory-mapped read, FITS catalogs only), to reduce
+#   the memory used by large catalogs. The columns used downstream are
+#   the positions (e.g., RA, DEC, X, Y) for the source names and the ASTs,
+#   the vega magnitudes (e.g., f475w_vega) for the AST magnitude cuts and
+#   field, inside_brick and inside_chipgap for the extra information of
+#   fit.IAU_names_and_extra_info(extraInfo=True)
+#   example: obs_keep_colnames = ['RA', 'DEC', 'X', 'Y'] \
+#                + [ f.lower() + '_vega' for f in basefilters ]
+obs_keep_colnames = None
 
 # obsfile : string 
 #   pathname of the observed catalog
@@ -130,16 +152,22 @@ ast_coord_boundary = None
 #   pathname of the AST files (single camera ASTs)
 astfile = 'data/fake_stars_b15_27_all.hd5'
 
-# ast_colnames : list of strings 
+# ast_colnames : tuple of strings 
 #   names of columns for filters in the AST catalog (AC)
-ast_colnames = np.array(basefilters)
+ast_colnames = basefilters
 
 # noisefile : string
 #   create a name for the noise model
 noisefile = project + '/' + project + '_noisemodel.hd5'
 
 # absflux calibration covariance matrix for HST specific filters (AC)
-absflux_a_matrix = absflux_covmat.hst_frac_matrix(filters)
+#   computed when needed by get_absflux_a_matrix() and cached on disk
+
+# cache_dir : string
+#   directory for the on-disk cache of derived quantities (AC)
+#   the cache files are keyed on the BEAST version and on the path and
+#   modification time of the library files they are computed from
+cache_dir = os.path.expanduser('~/.cache/beast')
 
 # Distances: distance to the galaxy [min, max, step] or [fixed number]
 distances = [24.47]
@@ -168,26 +196,50 @@ logt = [6.0, 10.13, 1.0]
 #   can they be set as [min, max, step]?
 z = [0.03, 0.019, 0.008, 0.004]
 
-# Isochrone Model Grid
-#   Current Choices: Padova or MIST
-#   PadovaWeb() -- `modeltype` param for iso sets from ezpadova
-#      (choices: parsec12s_r14, parsec12s, 2010, 2008, 2002)
-#   MISTWeb() -- `rotation` param (choices: vvcrit0.0=default, vvcrit0.4)
-#
-# Default: PARSEC+COLIBRI
-oiso = isochrone.PadovaWeb()
-# Alternative: PARSEC1.2S -- old grid parameters
-#oiso = isochrone.PadovaWeb(modeltype='parsec12s', filterPMS=True)
-# Alternative: MIST -- v1, no rotation
-#oiso = isochrone.MISTWeb()
-
-# Stellar Atmospheres library definition
-osl = stellib.Tlusty() + stellib.Kurucz()
+# Physics models: isochrones (oiso), stellar atmospheres (osl) and
+#   dust extinction law (extLaw)
+#   built once, when first needed, by build_physics_models()
+PhysicsModels = namedtuple('PhysicsModels', ['oiso', 'osl', 'extLaw'])
+
+
+@memoize
+def build_physics_models():
+    """ Build the isochrone, stellar atmosphere and extinction models
+
+    returns
+    -------
+    models: PhysicsModels
+        oiso, osl and extLaw models
+    """
+    from beast.physicsmodel.stars import isochrone
+    from beast.physicsmodel.stars import stellib
+    from beast.physicsmodel.dust import extinction
+
+    # Isochrone Model Grid
+    #   Current Choices: Padova or MIST
+    #   PadovaWeb() -- `modeltype` param for iso sets from ezpadova
+    #      (choices: parsec12s_r14, parsec12s, 2010, 2008, 2002)
+    #   MISTWeb() -- `rotation` param (choices: vvcrit0.0=default, vvcrit0.4)
+    #
+    # Default: PARSEC+COLIBRI
+    oiso = isochrone.PadovaWeb()
+    # Alternative: PARSEC1.2S -- old grid parameters
+    #oiso = isochrone.PadovaWeb(modeltype='parsec12s', filterPMS=True)
+    # Alternative: MIST -- v1, no rotation
+    #oiso = isochrone.MISTWeb()
+
+    # Stellar Atmospheres library definition
+    osl = stellib.Tlusty() + stellib.Kurucz()
+
+    # Dust extinction law
+    extLaw = extinction.Gordon16_RvFALaw()
+
+    return PhysicsModels(oiso, osl, extLaw)
 
 ################
 
 ### Dust extinction grid definition
-extLaw = extinction.Gordon16_RvFALaw()
+#   (extinction law: see build_physics_models above)
 
 # A(V): dust column in magnitudes
 #   acceptable avs > 0.0
@@ -227,6 +279,45 @@ add_spectral_properties_kwargs = dict(filternames=filters)
 # The following code does not require user's attention (AC)
 ################
 
+# immutable copy of the grid definition and its signature, for scripts
+#   that want to key their own caches on the grid (not used by the
+#   BEAST pipeline itself). Built from the current values of the lists
+#   above, which are kept for the user inputs and verify_params.
+Grid = namedtuple('Grid', ['logt', 'z', 'avs', 'rvs', 'fAs', 'filters'])
+
+
+def get_grid():
+    """ Immutable copy of the current grid definition
+
+    returns
+    -------
+    grid: Grid
+        logt, z, avs, rvs, fAs and filters as tuples
+    """
+    return Grid(tuple(logt), tuple(z), tuple(avs), tuple(rvs), tuple(fAs),
+                tuple(filters))
+
+
+def grid_signature(grid=None):
+    """ Signature of a grid definition
+
+    Unlike hash(), the value does not change between python sessions.
+
+    Parameters
+    ----------
+    grid: Grid, optional (default: get_grid())
+        grid definition
+
+    returns
+    -------
+    signature: str
+        hash of the grid definition
+    """
+    if grid is None:
+        grid = get_grid()
+    return _cache_key(*grid)
+
+
 class GenFluxCatalog(Observations):
     """Generic n band filter photometry
     This class implements a direct access to the Generic HST measured fluxes.
@@ -235,20 +326,50 @@ class GenFluxCatalog(Observations):
         it does not implement uncertainties as in this model, the noise is
         given through artificial star tests
     """
-    def __init__(self, inputFile, filters=filters):
+    def __init__(self, inputFile, filters=filters, vega_fname=None):
         """ Construct the interface """
         desc = 'GENERIC star: %s' % inputFile
         Observations.__init__(self, inputFile, desc=desc)
-        self.setFilters( filters )
-        #some bad values smaller than expected
-        # in physical flux units
-        self.setBadValue(6e-40)
 
         # rate column needed as this is the *flux* column
+        # (aliases must exist before setFilters resolves them)
         for ik,k in enumerate(filters):
             self.data.set_alias(k, obs_colnames[ik])
 
-    def getFlux(self, num, units=False):
+        self.setFilters( filters, vega_fname=vega_fname )
+
+        # unit of the fluxes, built once for getFluxQuantity
+        self._erg_unit = units.erg / (units.s*units.cm*units.cm*units.angstrom)
+
+        #some bad values smaller than expected
+        # in physical flux units
+        self.setBadValue(6e-40)
+
+    def readData(self):
+        """ read the dataset from the original source file
+
+        If obs_keep_colnames is set, FITS catalogs are memory-mapped and
+        only the obs_colnames and obs_keep_colnames columns are copied in
+        memory. The flux columns are kept in the table (in addition to the
+        flux matrix built by setFilters) as fit.IAU_names_and_extra_info
+        and trim_grid.trim_models read them through obsdata.data.
+        """
+        if (obs_keep_colnames is not None
+                and isinstance(self.inputFile, str)
+                and self.inputFile.endswith('.fits')):
+            t = Table.read(self.inputFile, memmap=True)
+            keep = list(obs_colnames) + list(obs_keep_colnames)
+            missing = [ k for k in keep if k not in t.colnames ]
+            if len(missing) > 0:
+                raise ValueError('columns %s not in %s'
+                                 % (missing, self.inputFile))
+            self.data = AstroTable(OrderedDict((k, np.array(t[k]))
+                                               for k in keep))
+            del t
+        else:
+            Observations.readData(self)
+
+    def getFlux(self, num):
         """returns the absolute flux of an observation 
 
         Parameters
@@ -256,9 +377,6 @@ class GenFluxCatalog(Observations):
         num: int
             index of the star in the catalog to get measurement from
 
-        units: bool
-            if set returns the fluxes with a unit capsule
-
         Returns
         -------
         flux: ndarray[dtype=float, ndim=1]
@@ -267,23 +385,112 @@ class GenFluxCatalog(Observations):
         """
 
         # case for using '_flux' result
-        d = self.data[num]
-        
-        flux = np.array([ d[self.data.resolve_alias(ok)] 
-                          for ok in self.filters ]) * self.vega_flux
-        
-        if units is True:
-            return flux * units.erg / (units.s*units.cm*units.cm*units.angstrom)
+        #   float32 rates times float64 vega fluxes: float64 result
+        return self._flux_matrix[num] * self.vega_flux
+
+    def getFluxQuantity(self, num):
+        """returns the absolute flux of an observation with its units
+
+        Parameters
+        ----------
+        num: int
+            index of the star in the catalog to get measurement from
+
+        Returns
+        -------
+        flux: astropy.units.Quantity
+            Measured integrated flux values throughout the filters 
+            in erg/s/cm^2/A
+        """
+        return self.getFlux(num) * self._erg_unit
+
+    def getFluxes(self, indices=None, out=None):
+        """returns the absolute fluxes of a set of observations at once
+
+        Uses the numba kernel when numba is installed, numpy otherwise.
+
+        Parameters
+        ----------
+        indices: int sequence or slice, optional
+            indices of the stars in the catalog (default: all stars)
+            (ValueError for a scalar index, see getFlux)
+
+        out: ndarray[dtype=float, ndim=2], optional
+            preallocated (nstars, nfilters) float64 output array, to be
+            reused across calls in batched loops
+            (ValueError if its shape or dtype does not match)
+
+        Returns
+        -------
+        fluxes: ndarray[dtype=float, ndim=2]
+            Measured integrated flux values (nstars, nfilters)
+            in erg/s/cm^2/A
+        """
+        from beast.observationmodel._numba_kernels import apply_vega
+
+        if indices is None:
+            flux = self._flux_matrix
         else:
-            return flux
+            # a single index would select a 1d row: use getFlux instead
+            if not isinstance(indices, slice) and np.ndim(indices) != 1:
+                raise ValueError('indices must be an int sequence or a '
+                                 'slice, not %r (use getFlux for a single '
+                                 'star)' % (indices,))
+            flux = np.ascontiguousarray(self._flux_matrix[indices])
+
+        if out is None:
+            out = np.empty(flux.shape, dtype=np.float64)
+
+        return apply_vega(flux, self.vega_flux, out)
+
+    def setBadValue(self, val):
+        """ set the bad value below which measurements are flagged as bad
+
+        Parameters
+        ----------
+        val: float
+            fluxes below this value (in erg/s/cm^2/A) are flagged as bad
+        """
+        self.badvalue = val
+        # computed on first use, see getBadMask
+        self._bad_mask = None
+
+    def getBadMask(self, num):
+        """returns the bad measurement mask of an observation
+
+        Parameters
+        ----------
+        num: int
+            index of the star in the catalog
+
+        Returns
+        -------
+        mask: ndarray[dtype=bool, ndim=1]
+            True for the filters with a flux below the bad value
+        """
+        if self._bad_mask is None:
+            self._bad_mask = self._compute_bad_mask()
+        return self._bad_mask[num]
+
+    def _compute_bad_mask(self):
+        """ flag all the bad measurements in a single vectorized pass """
+        if self.badvalue is None:
+            return np.zeros(self._flux_matrix.shape, dtype=bool)
+
+        # compare the rates to the per filter bad value threshold
+        #   instead of converting the full matrix to physical fluxes
+        return self._flux_matrix < self.badvalue / self.vega_flux[None, :]
 
-    def setFilters(self, filters):
+    def setFilters(self, filters, vega_fname=None):
         """ set the filters and update the vega reference for the conversions
 
         Parameters
         ----------
         filters: sequence
             list of filters using the internally normalized namings
+
+        vega_fname: str, optional
+            vega library file (default: the BEAST library file)
         """
         self.filters = filters
 
@@ -293,13 +500,167 @@ class GenFluxCatalog(Observations):
         #   getting vega mags, require to open and read the content of one file.
         #   since getObs, calls getFlux, for each star you need to do this
         #   expensive operation
-        with Vega() as v:
+        #   (cached on disk per filter set, see get_vega_flux)
+        vega_flux = get_vega_flux(filters, vega_fname=vega_fname)
+
+        # vega_flux is the only per filter constant of the conversion:
+        #   the distances are applied to the model SEDs once, when building
+        #   the grid (see creategrid.apply_distance_grid), and must not be
+        #   folded in here
+        self.vega_flux = np.asarray(vega_flux, dtype=np.float64)
+
+        # resolve the column aliases once instead of for every star
+        self._resolved_cols = [ self.data.resolve_alias(ok) for ok in filters ]
+
+        # copy the rates into one contiguous (nstars, nfilters) float32 array
+        #   for the per star and batched reads; this is not a memory saving:
+        #   the float64 rate columns stay in self.data, where fit and
+        #   trim_grid read them, so the matrix is an extra compact copy
+        #   float32 keeps ~7 significant digits, well below the photometric
+        #   uncertainties; the fluxes are still computed and returned as
+        #   float64, so the observed SEDs used in the fitting keep their dtype
+        self._flux_matrix = np.ascontiguousarray(np.column_stack(
+            [ np.asarray(self.data[c], dtype=np.float32)
+              for c in self._resolved_cols ]))
+
+        # depends on the vega fluxes, computed on first use
+        self._bad_mask = None
+
+
+# os.replace is python 3 only, os.rename also replaces on POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _cache_key(*parts):
+    """ Hash of the parts identifying a cached quantity
+
+    Unlike hash(), the value does not change between python sessions
+    (string hashing is randomized).
+    """
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _source_id(fname):
+    """ Path and modification time of a library file a cache depends on """
+    return (os.path.abspath(fname), os.path.getmtime(fname))
+
+
+def _cache_fname(prefix, *parts):
+    """ Name of the cache file of a quantity derived from the parts """
+    key = _cache_key(beast_version, *parts)
+    return os.path.join(cache_dir, '%s_%s.npz' % (prefix, key))
+
+
+def _cached_array(fname, compute):
+    """ Load an array from its cache file or compute and cache it
+
+    The cache file is written to a temporary file first and then moved in
+    place, so that processes running in parallel never read a partially
+    written file.
+
+    Parameters
+    ----------
+    fname: str
+        cache file name
+
+    compute: callable
+        function with no argument computing the array on a cache miss
+
+    returns
+    -------
+    m: ndarray
+        cached or computed array
+    """
+    if os.path.isfile(fname):
+        with np.load(fname) as f:
+            return f['m']
+
+    m = compute()
+
+    try:
+        os.makedirs(cache_dir)
+    except OSError:
+        if not os.path.isdir(cache_dir):
+            raise
+
+    fd, tmpname = tempfile.mkstemp(dir=cache_dir, suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, m=m)
+        _replace(tmpname, fname)
+    except Exception:
+        os.remove(tmpname)
+        raise
+    return m
+
+
+def get_absflux_a_matrix(filters=filters, hst_fname=None, filterLib=None):
+    """ absflux calibration covariance matrix, cached on disk
+
+    Parameters
+    ----------
+    filters: sequence(str), optional, datamodel.filters
+        sequence of filters of the data
+
+    hst_fname: str, optional
+        file with the hst absflux covariance matrix
+        (default: the BEAST library file)
+
+    filterLib: str, optional
+        filter library hd5 file (default: the BEAST library file)
+
+    returns
+    -------
+    absflux_a_matrix: ndarray
+        fractional absflux calibration covariance matrix
+    """
+    if hst_fname is None:
+        hst_fname = __ROOT__ + '/hst_whitedwarf_frac_covar.fits'
+    if filterLib is None:
+        filterLib = __ROOT__ + '/filters.hd5'
+
+    fname = _cache_fname('absflux', tuple(filters), _source_id(hst_fname),
+                         _source_id(filterLib))
+
+    def compute():
+        from beast.observationmodel.noisemodel import absflux_covmat
+        return absflux_covmat.hst_frac_matrix(filters, hst_fname=hst_fname,
+                                              filterLib=filterLib)
+
+    return _cached_array(fname, compute)
+
+
+def get_vega_flux(filters=filters, vega_fname=None):
+    """ vega fluxes of the filters, cached on disk
+
+    Parameters
+    ----------
+    filters: sequence(str), optional, datamodel.filters
+        sequence of filters of the data
+
+    vega_fname: str, optional
+        vega library file (default: the BEAST library file)
+
+    returns
+    -------
+    vega_flux: ndarray
+        vega fluxes in erg/s/cm^2/A
+    """
+    if vega_fname is None:
+        vega_fname = __ROOT__ + '/vega.hd5'
+
+    fname = _cache_fname('vega_flux', tuple(filters), _source_id(vega_fname))
+
+    def compute():
+        with Vega(source=vega_fname) as v:
             _, vega_flux, _ = v.getFlux(filters)
+        return vega_flux
 
-        self.vega_flux = vega_flux
+    return _cached_array(fname, compute)
 
 
-def get_obscat(obsfile=obsfile, filters=filters, *args, **kwargs):
+def get_obscat(obsfile=obsfile, filters=filters, vega_fname=None,
+               *args, **kwargs):
     """ Function that generates a data catalog object with the correct
     arguments
 
@@ -311,10 +672,13 @@ def get_obscat(obsfile=obsfile, filters=filters, *args, **kwargs):
     filters: sequence(str), optional, datamodel.filters
         seaquence of filters of the data
 
+    vega_fname: str, optional
+        vega library file (default: the BEAST library file)
+
     returns
     -------
     obs: GenFluxCatalog
         observation catalog
     """
-    obs = GenFluxCatalog(obsfile, filters=filters)
+    obs = GenFluxCatalog(obsfile, filters=filters, vega_fname=vega_fname)
     return obs
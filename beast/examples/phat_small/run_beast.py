@@ -66,9 +66,12 @@ if __name__ == '__main__':
         # make sure the project directory exists
         pdir = create_project_dir(datamodel.project)
 
+        # build the isochrone, stellar atmosphere and extinction models
+        physics_models = datamodel.build_physics_models()
+
         # download and load the isochrones
         (iso_fname, oiso) = make_iso_table(datamodel.project,
-                                           oiso=datamodel.oiso,
+                                           oiso=physics_models.oiso,
                                            logtmin=datamodel.logt[0],
                                            logtmax=datamodel.logt[1],
                                            dlogt=datamodel.logt[2],
@@ -88,7 +91,7 @@ if __name__ == '__main__':
         (spec_fname, g_spec) = make_spectral_grid(
             datamodel.project,
             oiso,
-            osl=datamodel.osl,
+            osl=physics_models.osl,
             redshift=redshift,
             distance=datamodel.distances,
             distance_unit=datamodel.distance_unit,
@@ -106,7 +109,7 @@ if __name__ == '__main__':
             datamodel.project,
             g_pspec,
             datamodel.filters,
-            extLaw=datamodel.extLaw,
+            extLaw=physics_models.extLaw,
             av=datamodel.avs,
             rv=datamodel.rvs,
             fA=datamodel.fAs,
@@ -188,7 +191,7 @@ if __name__ == '__main__':
            datamodel.noisefile,
            datamodel.astfile,
            modelsedgrid,
-           absflux_a_matrix=datamodel.absflux_a_matrix,
+           absflux_a_matrix=datamodel.get_absflux_a_matrix(),
            use_rate=False)
 
         # in the absence of ASTs, the splinter noise model can be used
@@ -199,7 +202,7 @@ if __name__ == '__main__':
         # noisemodel.make_splinter_noise_model(
         #    datamodel.noisefile,
         #    modelsedgrid,
-        #    absflux_a_matrix=datamodel.absflux_a_matrix)
+        #    absflux_a_matrix=datamodel.get_absflux_a_matrix())
 
     if args.trim:
         print('Trimming the model and noise grids')
@@ -135,9 +135,16 @@ if __name__ == '__main__':
         # make sure the project directory exists
         pdir = create_project_dir(datamodel.project)
 
+        # datamodels derived from the phat_small example build the physics
+        #   models on demand, older ones define them directly
+        if hasattr(datamodel, 'build_physics_models'):
+            physics_models = datamodel.build_physics_models()
+        else:
+            physics_models = datamodel
+
         # download and load the isochrones
         (iso_fname, oiso) = make_iso_table(datamodel.project,
-                                           oiso=datamodel.oiso,
+                                           oiso=physics_models.oiso,
                                            logtmin=datamodel.logt[0],
                                            logtmax=datamodel.logt[1],
                                            dlogt=datamodel.logt[2],
@@ -152,7 +159,7 @@ if __name__ == '__main__':
         (spec_fname, g_spec) = make_spectral_grid(
             datamodel.project,
             oiso,
-            osl=datamodel.osl,
+            osl=physics_models.osl,
             distance=datamodel.distances,
             distance_unit=datamodel.distance_unit,
             add_spectral_properties_kwargs=extra_kwargs)
@@ -177,7 +184,7 @@ if __name__ == '__main__':
                 datamodel.project,
                 sub_g_pspec,
                 datamodel.filters,
-                extLaw=datamodel.extLaw,
+                extLaw=physics_models.extLaw,
                 av=datamodel.avs,
                 rv=datamodel.rvs,
                 fA=datamodel.fAs,
@@ -299,11 +306,18 @@ if __name__ == '__main__':
                 create_project_dir(os.path.dirname(noisefile))
                 astfile = subcatalog_fname(astfile, args.dens_bin)
 
+            # datamodels derived from the phat_small example compute the absflux
+            #   matrix on demand, older ones define it directly
+            if hasattr(datamodel, 'get_absflux_a_matrix'):
+                absflux_a_matrix = datamodel.get_absflux_a_matrix()
+            else:
+                absflux_a_matrix = datamodel.absflux_a_matrix
+
             outname = noisemodel.make_toothpick_noise_model(
                 noisefile,
                 astfile,
                 modelsedgrid,
-                absflux_a_matrix=datamodel.absflux_a_matrix)
+                absflux_a_matrix=absflux_a_matrix)
 
             return outname
 
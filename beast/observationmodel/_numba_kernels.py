@@ -0,0 +1,74 @@
+"""
+Compiled kernels for the observation catalogs.
+
+Numba is optional: without it the kernels fall back to plain numpy
+broadcasting with the same call signature.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import numpy as np
+
+try:
+    import numba
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+__all__ = ['apply_vega']
+
+
+def _apply_vega_numpy(flux, vega_flux, out):
+    """ numpy version of apply_vega """
+    return np.multiply(flux, vega_flux[None, :], out=out)
+
+
+if _HAS_NUMBA:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _apply_vega_numba(flux, vega_flux, out):
+        """ numba version of apply_vega """
+        for i in numba.prange(flux.shape[0]):
+            for k in range(flux.shape[1]):
+                out[i, k] = flux[i, k] * vega_flux[k]
+        return out
+
+    _apply_vega = _apply_vega_numba
+else:
+    _apply_vega = _apply_vega_numpy
+
+
+def apply_vega(flux, vega_flux, out):
+    """ convert vega normalized rates into physical fluxes
+
+    The inputs are checked before calling the numba kernel: it does not
+    check the bounds of the arrays.
+
+    Parameters
+    ----------
+    flux: ndarray[ndim=2]
+        (nstars, nfilters) rates normalized to vega
+
+    vega_flux: ndarray[ndim=1]
+        (nfilters) vega fluxes
+
+    out: ndarray[ndim=2]
+        (nstars, nfilters) preallocated output array, with the dtype of
+        flux * vega_flux
+
+    Returns
+    -------
+    out: ndarray[ndim=2]
+        the output array filled with flux * vega_flux
+    """
+    if flux.ndim != 2 or vega_flux.shape != (flux.shape[1],):
+        raise ValueError('flux shape %s and vega_flux shape %s do not match'
+                         % (flux.shape, vega_flux.shape))
+    if out.shape != flux.shape:
+        raise ValueError('out shape %s differs from the flux shape %s'
+                         % (out.shape, flux.shape))
+    dtype = np.result_type(flux, vega_flux)
+    if out.dtype != dtype:
+        raise ValueError('out dtype %s differs from the flux dtype %s'
+                         % (out.dtype, dtype))
+
+    return _apply_vega(flux, vega_flux, out)
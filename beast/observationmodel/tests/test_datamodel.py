@@ -0,0 +1,224 @@
+import os
+
+import numpy as np
+import pytest
+
+from astropy.table import Table
+from astropy.tests.helper import remote_data
+
+from beast.observationmodel.vega import Vega
+from beast.tests.helpers import download_rename, load_example_datamodel
+
+
+def test_cached_array(tmpdir):
+
+    datamodel = load_example_datamodel('phat_small')
+    # cache directory does not exist yet
+    datamodel.cache_dir = str(tmpdir.join('cache'))
+
+    ncalls = []
+
+    def compute():
+        ncalls.append(1)
+        return np.arange(6.).reshape(2, 3)
+
+    # miss: computed and written, without leftover temporary file
+    fname = datamodel._cache_fname('test', ('a', 'b'))
+    m_miss = datamodel._cached_array(fname, compute)
+    assert len(ncalls) == 1
+    assert os.listdir(datamodel.cache_dir) == [os.path.basename(fname)]
+
+    # hit: read back from the cache file
+    m_hit = datamodel._cached_array(fname, compute)
+    assert len(ncalls) == 1
+    np.testing.assert_array_equal(m_hit, m_miss)
+
+    # another quantity in the existing cache directory
+    fname_other = datamodel._cache_fname('test', ('c',))
+    datamodel._cached_array(fname_other, compute)
+    assert len(ncalls) == 2
+    assert os.path.isfile(fname_other)
+
+
+def test_cache_fname(tmpdir):
+
+    datamodel = load_example_datamodel('phat_small')
+    datamodel.cache_dir = str(tmpdir)
+
+    libfile = tmpdir.join('lib.hd5')
+    libfile.write('lib')
+    os.utime(str(libfile), (1000., 1000.))
+
+    def cache_fname(filters):
+        return datamodel._cache_fname('test', tuple(filters),
+                                      datamodel._source_id(str(libfile)))
+
+    # stable for the same inputs
+    fname = cache_fname(['F275W', 'F336W'])
+    assert fname == cache_fname(['F275W', 'F336W'])
+
+    # changes with the filters
+    assert fname != cache_fname(['F336W', 'F275W'])
+
+    # changes when the library file is updated
+    os.utime(str(libfile), (2000., 2000.))
+    assert fname != cache_fname(['F275W', 'F336W'])
+
+
+@remote_data
+def test_genfluxcatalog_fluxes(tmpdir):
+
+    # download the needed files
+    vega_fname = download_rename('vega.hd5')
+    obs_fname = download_rename('b15_4band_det_27_A.fits')
+
+    datamodel = load_example_datamodel('phat_small')
+    datamodel.cache_dir = str(tmpdir)
+
+    obsdata = datamodel.get_obscat(obs_fname, datamodel.filters,
+                                   vega_fname=vega_fname)
+
+    # float64 reference: rates times vega fluxes
+    with Vega(source=vega_fname) as v:
+        _, vega_flux, _ = v.getFlux(datamodel.filters)
+    obs_table = Table.read(obs_fname)
+    rates = np.column_stack([np.asarray(obs_table[k], dtype=np.float64)
+                             for k in datamodel.obs_colnames])
+    flux_ref = rates * vega_flux[None, :]
+
+    # rates are stored as float32: relative precision of ~6e-8
+    fluxes = obsdata.getFluxes()
+    assert fluxes.dtype == np.float64
+    np.testing.assert_allclose(fluxes, flux_ref, rtol=1e-6)
+
+    for k in range(0, len(obsdata), 97):
+        flux = obsdata.getFlux(k)
+        assert flux.dtype == np.float64
+        np.testing.assert_allclose(flux, flux_ref[k], rtol=1e-6)
+
+
+def _fixed_vega_genfluxcatalog(datamodel, tmpdir, monkeypatch, rates):
+    """ GenFluxCatalog of synthetic rates, with fixed vega fluxes """
+    # avoids downloading the vega library
+    vega_flux = np.logspace(-9., -8., len(datamodel.filters))
+    monkeypatch.setattr(datamodel, 'get_vega_flux',
+                        lambda filters, vega_fname=None: vega_flux)
+
+    obs_fname = str(tmpdir.join('rates.fits'))
+    Table(rates, names=datamodel.obs_colnames).write(obs_fname)
+
+    obsdata = datamodel.GenFluxCatalog(obs_fname, filters=datamodel.filters)
+    return obsdata, vega_flux
+
+
+def test_genfluxcatalog_bad_mask(tmpdir, monkeypatch):
+
+    datamodel = load_example_datamodel('phat_small')
+    datamodel.cache_dir = str(tmpdir)
+
+    # rates spread over four decades around the bad value threshold
+    #   (for vega fluxes between 1e-9 and 1e-8)
+    badvalue = 6e-40
+    nstars = 500
+    rng = np.random.RandomState(1234)
+    rates = 10 ** rng.uniform(-33., -29., (nstars, len(datamodel.filters)))
+
+    obsdata, _ = _fixed_vega_genfluxcatalog(datamodel, tmpdir, monkeypatch,
+                                            rates)
+    obsdata.setBadValue(badvalue)
+
+    # both sides of the threshold are tested
+    bad = obsdata.getFluxes() < badvalue
+    assert bad.any() and not bad.all()
+
+    # the rate threshold badvalue / vega_flux flags the same measurements
+    #   as comparing the physical fluxes to badvalue
+    for k in range(nstars):
+        np.testing.assert_array_equal(obsdata.getBadMask(k),
+                                      obsdata.getFlux(k) < badvalue)
+
+
+def test_genfluxcatalog_getfluxes(tmpdir, monkeypatch):
+
+    datamodel = load_example_datamodel('phat_small')
+    datamodel.cache_dir = str(tmpdir)
+
+    nstars = 50
+    rng = np.random.RandomState(1234)
+    rates = rng.uniform(0., 10., (nstars, len(datamodel.filters)))
+    obsdata, vega_flux = _fixed_vega_genfluxcatalog(datamodel, tmpdir,
+                                                    monkeypatch, rates)
+
+    # all the stars at once equals the stacked getFlux rows
+    flux_rows = np.array([obsdata.getFlux(k) for k in range(nstars)])
+    fluxes = obsdata.getFluxes()
+    assert fluxes.dtype == np.float64
+    np.testing.assert_allclose(fluxes, flux_rows, rtol=1e-12)
+    np.testing.assert_allclose(fluxes, rates * vega_flux[None, :], rtol=1e-6)
+
+    # subset, reusing a preallocated output array across calls
+    indices = np.arange(0, nstars - 1, 7)
+    out = np.empty((len(indices), len(datamodel.filters)), dtype=np.float64)
+    for k in range(2):
+        fluxes = obsdata.getFluxes(indices + k, out=out)
+        assert fluxes is out
+        np.testing.assert_allclose(fluxes, flux_rows[indices + k],
+                                   rtol=1e-12)
+
+    # slice
+    np.testing.assert_allclose(obsdata.getFluxes(slice(3, 10)),
+                               flux_rows[3:10], rtol=1e-12)
+
+    # output array of the wrong shape
+    with pytest.raises(ValueError):
+        obsdata.getFluxes(indices[:-1], out=out)
+
+    # single star: use getFlux
+    with pytest.raises(ValueError):
+        obsdata.getFluxes(3)
+
+
+@remote_data
+def test_genfluxcatalog_keep_colnames(tmpdir):
+
+    vega_fname = download_rename('vega.hd5')
+    obs_fname = download_rename('b15_4band_det_27_A.fits')
+
+    datamodel = load_example_datamodel('phat_small')
+    datamodel.cache_dir = str(tmpdir)
+
+    # default: full catalog
+    obs_full = datamodel.get_obscat(obs_fname, datamodel.filters,
+                                    vega_fname=vega_fname)
+    extra_cols = [ k for k in obs_full.keys()
+                   if k not in datamodel.obs_colnames ][:2]
+
+    # projected catalog
+    datamodel.obs_keep_colnames = extra_cols
+    obs_proj = datamodel.get_obscat(obs_fname, datamodel.filters,
+                                    vega_fname=vega_fname)
+    assert (list(obs_proj.keys())
+            == list(datamodel.obs_colnames) + extra_cols)
+    for k in extra_cols:
+        np.testing.assert_array_equal(obs_proj[k], obs_full[k])
+    np.testing.assert_array_equal(obs_proj.getFluxes(), obs_full.getFluxes())
+
+    # requested column missing from the catalog
+    datamodel.obs_keep_colnames = ['not_a_column']
+    with pytest.raises(ValueError):
+        datamodel.get_obscat(obs_fname, datamodel.filters,
+                             vega_fname=vega_fname)
+
+
+def test_grid_signature():
+
+    datamodel = load_example_datamodel('phat_small')
+
+    grid = datamodel.get_grid()
+    signature = datamodel.grid_signature()
+    assert signature == datamodel.grid_signature(grid)
+
+    # follows changes of the grid definition
+    datamodel.logt[2] = 0.5
+    assert datamodel.grid_signature() != signature
+    assert datamodel.grid_signature(grid) == signature
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from beast.observationmodel import _numba_kernels
+from beast.observationmodel._numba_kernels import apply_vega
+
+
+def _rates_and_vega():
+    rng = np.random.RandomState(1234)
+    flux = rng.uniform(0., 10., (100, 6)).astype(np.float32)
+    vega_flux = rng.uniform(1e-10, 1e-8, 6)
+    return flux, vega_flux
+
+
+def test_apply_vega():
+    flux, vega_flux = _rates_and_vega()
+    out = np.empty(flux.shape, dtype=np.float64)
+
+    res = apply_vega(flux, vega_flux, out)
+    assert res is out
+    np.testing.assert_allclose(res, flux * vega_flux[None, :], rtol=1e-12)
+
+
+@pytest.mark.skipif(not _numba_kernels._HAS_NUMBA,
+                    reason='numba is not installed')
+def test_apply_vega_numba_numpy():
+    flux, vega_flux = _rates_and_vega()
+
+    out_numpy = np.empty(flux.shape, dtype=np.float64)
+    _numba_kernels._apply_vega_numpy(flux, vega_flux, out_numpy)
+    out_numba = np.empty(flux.shape, dtype=np.float64)
+    _numba_kernels._apply_vega_numba(flux, vega_flux, out_numba)
+
+    # fastmath allows reordering, not for a single product
+    np.testing.assert_allclose(out_numba, out_numpy, rtol=1e-12)
+
+
+def test_apply_vega_checks():
+    flux, vega_flux = _rates_and_vega()
+
+    # too small output
+    with pytest.raises(ValueError):
+        apply_vega(flux, vega_flux, np.empty((10, 6), dtype=np.float64))
+
+    # output dtype different from the float64 result
+    with pytest.raises(ValueError):
+        apply_vega(flux, vega_flux, np.empty(flux.shape, dtype=np.float32))
+
+    # wrong number of vega fluxes
+    with pytest.raises(ValueError):
+        apply_vega(flux, vega_flux[:5], np.empty(flux.shape, dtype=np.float64))
@@ -4,12 +4,13 @@ import os.path
 
 import numpy as np
 import h5py
+import pytest
 
 from astropy.io import fits
 from astropy.utils.data import download_file
 
 __all__ = ['download_rename', 'compare_tables', 'compare_fits',
-           'compare_hdf5']
+           'compare_hdf5', 'load_example_datamodel']
 
 
 def download_rename(filename):
@@ -117,3 +118,33 @@ def compare_hdf5(fname_cache, fname_new, ctype=None):
                                                cvalue_new.value[ckey],
                                                err_msg=err_msg,
                                                rtol=1e-5)
+
+
+def load_example_datamodel(example):
+    """
+    Import the datamodel.py of one of the examples as a module.
+    The examples are not packages, hence the import from the file path.
+    The test is skipped if the examples are not available (e.g., when
+    testing an installed beast).
+
+    Parameters
+    ----------
+    example : str
+        name of the example directory (e.g., 'phat_small')
+    """
+    fname = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '..', 'examples', example, 'datamodel.py')
+    if not os.path.isfile(fname):
+        pytest.skip('%s example datamodel not found' % example)
+
+    modname = '%s_datamodel' % example
+    try:
+        from importlib.util import spec_from_file_location, module_from_spec
+    except ImportError:
+        import imp
+        return imp.load_source(modname, fname)
+
+    spec = spec_from_file_location(modname, fname)
+    datamodel = module_from_spec(spec)
+    spec.loader.exec_module(datamodel)
+    return datamodel